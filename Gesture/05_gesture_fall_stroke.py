@@ -1,23 +1,60 @@
+import os
+os.environ.setdefault("GLOG_minloglevel", "2") # Silence MediaPipe's init logging; must precede the import
+
 import cv2
 import mediapipe as mp
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
 import time
 import math
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from gesture_core import (CameraThread, DisplayThread, draw_text, fingers_from_landmarks,
+                          get_thumb_sign, landmarks_to_array, to_landmark_list)
 
 # ==========================================
 #        1. INITIALIZATION & SETUP
 # ==========================================
 
-# --- MediaPipe Solutions ---
-mp_pose = mp.solutions.pose
+# --- MediaPipe Solutions (drawing only) ---
 mp_face = mp.solutions.face_mesh
 mp_hands = mp.solutions.hands
 mp_draw = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
+# --- MediaPipe Tasks ---
+POSE_MODEL_PATH = "pose_landmarker_lite.task"
+FACE_MODEL_PATH = "face_landmarker.task"
+HAND_MODEL_PATH = "hand_landmarker.task"
+
+BaseOptions = python.BaseOptions
+VisionRunningMode = vision.RunningMode
+
 # Initialize Detectors
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-face_mesh = mp_face.FaceMesh(min_detection_confidence=0.5, max_num_faces=1)
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
+# Tasks landmarkers run on the XNNPACK CPU delegate; VIDEO mode tracks across frames,
+# so person/face/palm detection only re-runs when tracking is lost
+pose = vision.PoseLandmarker.create_from_options(vision.PoseLandmarkerOptions(
+    base_options=BaseOptions(model_asset_path=POSE_MODEL_PATH, delegate=BaseOptions.Delegate.CPU),
+    running_mode=VisionRunningMode.VIDEO, num_poses=1,
+    min_pose_detection_confidence=0.5, min_tracking_confidence=0.5))
+face_mesh = vision.FaceLandmarker.create_from_options(vision.FaceLandmarkerOptions(
+    base_options=BaseOptions(model_asset_path=FACE_MODEL_PATH, delegate=BaseOptions.Delegate.CPU),
+    running_mode=VisionRunningMode.VIDEO, num_faces=1,
+    min_face_detection_confidence=0.5))
+hands = vision.HandLandmarker.create_from_options(vision.HandLandmarkerOptions(
+    base_options=BaseOptions(model_asset_path=HAND_MODEL_PATH, delegate=BaseOptions.Delegate.CPU),
+    running_mode=VisionRunningMode.VIDEO, num_hands=1,
+    min_hand_detection_confidence=0.7, min_tracking_confidence=0.5))
+
+# --- Detector Pipeline ---
+# Each detector runs on its own worker thread; the main loop fuses the latest results
+detectors = {"pose": pose, "face": face_mesh, "hands": hands}
+executor = ThreadPoolExecutor(max_workers=len(detectors))
+in_flight = {}                                       # name -> Future of the running job
+latest_results = {name: None for name in detectors}  # name -> newest finished result
+result_times = {name: 0 for name in detectors}       # name -> monotonic time its frame was grabbed
+results_lock = threading.Lock()
 
 # --- Configuration & Thresholds ---
 BODY_MISSING_THRESHOLD = 5.0     # Seconds body must be gone to trigger Fall Alert
@@ -26,98 +63,188 @@ FACE_ASYMMETRY_THRESHOLD = 0.03  # Sensitivity for Stroke detection
 # *** UPDATED: Time to hold ANY gesture before it activates ***
 GESTURE_HOLD_TIME = 3.0          
 
+DETECTOR_WAIT_TIMEOUT = 0.01     # Seconds to wait for in-flight detectors each frame
+
+# Detectors run on a downscaled copy; landmarks are normalized so drawing stays full-res
+DETECT_SIZE = (320, 240)         # Width, Height
+
+# Skip-frame detection: pose and face change slowly, so run them every N frames
+# and reuse the last result in between
+DETECT_EVERY_N = {"pose": 5, "face": 3, "hands": 1}
+
 # --- State Variables ---
 # Fall State
 body_missing_start = None
 fall_alert_active = False
+last_search_seconds = -1 # Whole seconds shown in the cached "Searching Body" label
+search_text = ""
 
 # Gesture State
 current_gesture = None
 gesture_start_time = 0
 confirmed_text = "Monitoring Active"
+last_seconds_left = -1   # Whole seconds shown in the cached countdown label
+countdown_text = ""
+hand_label = None        # Handedness the cached thumb sign was derived from
+thumb_sign = 1
+
+# Pipeline State
+fidx = 0                                       # Frame counter
+next_detect = {name: 0 for name in detectors}  # Frame each detector is next due on
+
+# Pre-allocated RGB buffers for the detectors: one per detector plus a spare, so the
+# buffer being converted into is never one a worker is still reading
+rgb_bufs = [np.empty((DETECT_SIZE[1], DETECT_SIZE[0], 3), np.uint8) for _ in range(len(detectors) + 1)]
+job_buf = {}                                   # name -> index of the buffer its job reads
+
+# Pre-allocated downscaled frame, reused every frame
+small_buf = np.empty((DETECT_SIZE[1], DETECT_SIZE[0], 3), np.uint8)
+
+# Stroke overlay: face tesselation drawn once per face result, then blitted each frame.
+# Allocated from the first frame's size, since the camera may not honour cap.set()
+face_overlay = None
+face_mask = None
+face_overlay_src = None                        # Face result the overlay was drawn from
 
 # --- Camera Setup ---
 cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
 cap.set(3, 640) # Width
 cap.set(4, 480) # Height
+cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Don't let the driver queue up stale frames
 
 # ==========================================
 #        2. HELPER FUNCTIONS
 # ==========================================
 
-def get_fingers_status(hand, label):
-    """Returns list of 1s (Open) and 0s (Closed) for [Thumb, Index, Middle, Ring, Pinky]"""
-    lm = hand.landmark
-    fingers = []
-    TIP_IDS = [4, 8, 12, 16, 20]
-
-    # Thumb Logic (Mirror Safe)
-    if label == "Left": 
-        fingers.append(1 if lm[4].x < lm[3].x else 0)
-    else: 
-        fingers.append(1 if lm[4].x > lm[3].x else 0)
-
-    # 4 Fingers Logic
-    for i in range(1, 5):
-        fingers.append(1 if lm[TIP_IDS[i]].y < lm[TIP_IDS[i]-2].y else 0)
-            
-    return fingers
-
-def identify_gesture(f):
-    """Maps finger states to meaning."""
-    # [Thumb, Index, Middle, Ring, Pinky]
-    if f == [1, 0, 0, 0, 0]: return "THUMB_EMERGENCY" 
-    if f == [1, 1, 0, 0, 0]: return "Need Water/Food"
-    if f == [0, 1, 0, 0, 0]: return "Want Restroom"
-    if f == [0, 0, 1, 1, 1]: return "Want Medicine"
-    if f == [1, 0, 1, 1, 1]: return "Adjust Position"
-    if f == [0, 1, 1, 0, 0]: return "Call Caregiver"
-    if f == [1, 1, 1, 0, 0]: return "Uncomfortable"
-    return None
+# Gesture table keyed on the packed finger states (Thumb is the lowest bit)
+GESTURES = {
+    0b00001: "THUMB_EMERGENCY",  # [1, 0, 0, 0, 0]
+    0b00011: "Need Water/Food",  # [1, 1, 0, 0, 0]
+    0b00010: "Want Restroom",    # [0, 1, 0, 0, 0]
+    0b11100: "Want Medicine",    # [0, 0, 1, 1, 1]
+    0b11101: "Adjust Position",  # [1, 0, 1, 1, 1]
+    0b00110: "Call Caregiver",   # [0, 1, 1, 0, 0]
+    0b00111: "Uncomfortable",    # [1, 1, 1, 0, 0]
+}
 
-def get_mouth_asymmetry(face_landmarks):
-    left_mouth = face_landmarks[61]
-    right_mouth = face_landmarks[291]
-    nose = face_landmarks[1]
+# Face mesh landmarks for the stroke check: left mouth corner, right mouth corner, nose tip
+MOUTH_IDS = (61, 291, 1)
 
-    left_rel = abs(left_mouth.y - nose.y)
-    right_rel = abs(right_mouth.y - nose.y)
+def get_mouth_asymmetry(face_landmarks):
+    # Only the needed landmarks are read, in one batch
+    ys = np.fromiter((face_landmarks[i].y for i in MOUTH_IDS), dtype=np.float64, count=len(MOUTH_IDS))
+    left_rel, right_rel = np.abs(ys[:2] - ys[2])
     return abs(left_rel - right_rel)
 
+def run_detector(name, rgb, frame_time):
+    """Worker: runs one detector on the frame and publishes its result."""
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+    results = detectors[name].detect_for_video(mp_image, int(frame_time * 1000))
+    with results_lock:
+        latest_results[name] = results
+        result_times[name] = frame_time
+
 # ==========================================
 #        3. MAIN LOOP
 # ==========================================
 print("System Starting... Press 'q' to exit.")
 
-while True:
-    success, frame = cap.read()
+# Warm up on a blank frame so model init and buffer allocation happen here,
+# not as a stall on the first real frame
+dummy = np.zeros((DETECT_SIZE[1], DETECT_SIZE[0], 3), np.uint8)
+dummy.flags.writeable = False
+dummy_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=dummy)
+for detector in detectors.values():
+    detector.detect_for_video(dummy_image, 0) # Real frames use later monotonic timestamps
+print("Warmup done")
+
+# Capture runs on its own thread, overlapping the camera with detection
+cam = CameraThread(cap)
+cam.start()
+
+# Display runs on its own thread too; the loop ends once 'q' is pressed there
+display = DisplayThread("Patient Monitor - All In One")
+display.start()
+
+while not display.quit.is_set():
+    success, frame = cam.read_latest()
     if not success: continue
+    now = time.monotonic() # One clock read per frame; monotonic so NTP jumps can't skew timers
 
-    # Flip & Convert
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # Flip
+    # Mirror in place: every capture is a fresh array we own, and drawing needs a
+    # contiguous image, so a frame[:, ::-1] view would only move the copy elsewhere
+    cv2.flip(frame, 1, dst=frame)
 
     status_color = (0, 255, 0) # Green default
     top_alert_text = ""
-    countdown_text = ""
+
+    # ----------------------------------------------------
+    # DETECTOR PIPELINE (Pose / Face / Hands in parallel)
+    # ----------------------------------------------------
+    # Detectors that are due on this frame and not still busy with an older one
+    ready = []
+    for name in detectors:
+        job = in_flight.get(name)
+        if fidx < next_detect[name] or (job is not None and not job.done()):
+            continue
+        if job is not None:
+            job.result() # Re-raise any detector error here
+        ready.append(name)
+
+    # Downscale & Convert only when a detector will actually consume the frame
+    if ready:
+        small = cv2.resize(frame, DETECT_SIZE, dst=small_buf, interpolation=cv2.INTER_AREA)
+        # Convert into an RGB buffer no running detector is still reading
+        busy = {job_buf[name] for name, job in in_flight.items() if not job.done()}
+        rgb_idx = next(i for i in range(len(rgb_bufs)) if i not in busy)
+        rgb = rgb_bufs[rgb_idx]
+        rgb.flags.writeable = True
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb)
+        rgb.flags.writeable = False # Read-only input lets MediaPipe skip its defensive copy
+
+        for name in ready:
+            in_flight[name] = executor.submit(run_detector, name, rgb, now)
+            job_buf[name] = rgb_idx
+            next_detect[name] = fidx + DETECT_EVERY_N[name]
+    fidx += 1
+
+    # Block until every detector has produced once, then only wait briefly
+    with results_lock:
+        warming_up = None in latest_results.values()
+    wait(in_flight.values(), timeout=None if warming_up else DETECTOR_WAIT_TIMEOUT)
+    if warming_up:
+        # A failed first job leaves its slot None; re-raise the real error instead
+        for job in in_flight.values():
+            if job.done():
+                job.result()
+
+    with results_lock:
+        pose_results = latest_results["pose"]
+        face_results = latest_results["face"]
+        hand_results = latest_results["hands"]
+        pose_time = result_times["pose"]
     
     # ----------------------------------------------------
     # MODULE A: FALL DETECTION
     # ----------------------------------------------------
-    pose_results = pose.process(rgb)
-    
     if not pose_results.pose_landmarks:
         if body_missing_start is None:
-            body_missing_start = time.time()
+            # Start from when the frame without a body was grabbed, not when we noticed
+            body_missing_start = pose_time
         
-        elapsed = time.time() - body_missing_start
+        elapsed = now - body_missing_start
         if elapsed > BODY_MISSING_THRESHOLD:
             top_alert_text = "FALL DETECTED / PATIENT MISSING"
             status_color = (0, 0, 255) # Red
             fall_alert_active = True
         else:
-            cv2.putText(frame, f"Searching Body: {int(BODY_MISSING_THRESHOLD - elapsed)}s", 
-                       (400, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+            # Only re-format the label when the whole-second value ticks
+            search_seconds = int(BODY_MISSING_THRESHOLD - elapsed)
+            if search_seconds != last_search_seconds:
+                last_search_seconds = search_seconds
+                search_text = f"Searching Body: {search_seconds}s"
+            draw_text(frame, search_text, (400, 30), 0.6, (0, 165, 255), 2)
     else:
         body_missing_start = None
         fall_alert_active = False
@@ -125,10 +252,8 @@ while True:
     # ----------------------------------------------------
     # MODULE B: STROKE DETECTION
     # ----------------------------------------------------
-    face_results = face_mesh.process(rgb)
-    
-    if face_results.multi_face_landmarks:
-        face_lm = face_results.multi_face_landmarks[0].landmark
+    if face_results.face_landmarks:
+        face_lm = face_results.face_landmarks[0]
         asymmetry = get_mouth_asymmetry(face_lm)
         
         if asymmetry > FACE_ASYMMETRY_THRESHOLD:
@@ -136,58 +261,73 @@ while True:
                 top_alert_text = "POSSIBLE STROKE DETECTED"
                 status_color = (0, 0, 255)
             
-            mp_draw.draw_landmarks(frame, face_results.multi_face_landmarks[0], 
-                                 mp_face.FACEMESH_TESSELATION,
-                                 landmark_drawing_spec=None,
-                                 connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style())
+            if face_overlay is None or face_overlay.shape != frame.shape:
+                face_overlay = np.empty_like(frame)
+                face_mask = np.empty(frame.shape[:2], np.uint8)
+                face_overlay_src = None
+
+            # Redraw the tesselation only when the (skip-frame) face result changes
+            if face_overlay_src is not face_results:
+                face_overlay_src = face_results
+                face_overlay[:] = 0
+                mp_draw.draw_landmarks(face_overlay, to_landmark_list(face_lm), 
+                                     mp_face.FACEMESH_TESSELATION,
+                                     landmark_drawing_spec=None,
+                                     connection_drawing_spec=mp_drawing_styles.get_default_face_mesh_tesselation_style())
+                cv2.cvtColor(face_overlay, cv2.COLOR_BGR2GRAY, dst=face_mask)
+            cv2.copyTo(face_overlay, face_mask, frame)
 
     # ----------------------------------------------------
     # MODULE C: GESTURE RECOGNITION (Unified 3s Timer)
     # ----------------------------------------------------
-    hand_results = hands.process(rgb)
-    
-    if hand_results.multi_hand_landmarks:
-        for idx, hand_lm in enumerate(hand_results.multi_hand_landmarks):
-            mp_draw.draw_landmarks(frame, hand_lm, mp_hands.HAND_CONNECTIONS)
-            
-            label = hand_results.multi_handedness[idx].classification[0].label
-            fingers = get_fingers_status(hand_lm, label)
-            gesture = identify_gesture(fingers)
-
-            if gesture:
-                # If we are holding the SAME gesture
-                if gesture == current_gesture:
-                    hold_duration = time.time() - gesture_start_time
-                    
-                    # Calculate remaining seconds for UI (3...2...1)
-                    seconds_left = math.ceil(GESTURE_HOLD_TIME - hold_duration)
-                    
-                    if hold_duration > GESTURE_HOLD_TIME:
-                        # --- 3 SECONDS PASSED: CONFIRM GESTURE ---
-                        if gesture == "THUMB_EMERGENCY":
-                            confirmed_text = "EMERGENCY: THUMB TRIGGERED"
-                            status_color = (0, 0, 255) # Red for emergency
-                        else:
-                            confirmed_text = gesture
-                            # If emergency was previously set, revert color to green for normal requests
-                            if "EMERGENCY" not in confirmed_text:
-                                status_color = (0, 255, 0)
+    if hand_results.hand_landmarks:
+        # num_hands=1, so there is at most one hand to look at
+        hand_lm = hand_results.hand_landmarks[0]
+        hand_pts = landmarks_to_array(hand_lm) # Shared by finger states and the wrist label
+        mp_draw.draw_landmarks(frame, to_landmark_list(hand_lm), mp_hands.HAND_CONNECTIONS)
+        
+        label = hand_results.handedness[0][0].category_name
+        if label != hand_label: # Handedness rarely changes; only re-derive the sign when it does
+            hand_label = label
+            thumb_sign = get_thumb_sign(label)
+        gesture = GESTURES.get(fingers_from_landmarks(hand_pts, thumb_sign))
+
+        if gesture:
+            # If we are holding the SAME gesture
+            if gesture == current_gesture:
+                hold_duration = now - gesture_start_time
+                
+                # Calculate remaining seconds for UI (3...2...1)
+                seconds_left = math.ceil(GESTURE_HOLD_TIME - hold_duration)
+                
+                if hold_duration > GESTURE_HOLD_TIME:
+                    # --- 3 SECONDS PASSED: CONFIRM GESTURE ---
+                    if gesture == "THUMB_EMERGENCY":
+                        confirmed_text = "EMERGENCY: THUMB TRIGGERED"
+                        status_color = (0, 0, 255) # Red for emergency
                     else:
-                        # --- COUNTING DOWN ---
-                        countdown_text = f"Holding: {seconds_left}s"
-                        
-                        # Draw countdown near the hand (using wrist coordinate)
-                        h, w, c = frame.shape
-                        cx, cy = int(hand_lm.landmark[0].x * w), int(hand_lm.landmark[0].y * h)
-                        cv2.putText(frame, countdown_text, (cx + 20, cy), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+                        confirmed_text = gesture
+                        # If emergency was previously set, revert color to green for normal requests
+                        if "EMERGENCY" not in confirmed_text:
+                            status_color = (0, 255, 0)
                 else:
-                    # New gesture detected, reset timer
-                    current_gesture = gesture
-                    gesture_start_time = time.time()
+                    # --- COUNTING DOWN ---
+                    # Only re-format the label when the whole-second value ticks
+                    if seconds_left != last_seconds_left:
+                        last_seconds_left = seconds_left
+                        countdown_text = f"Holding: {seconds_left}s"
+                    
+                    # Draw countdown near the hand (using wrist coordinate)
+                    h, w, c = frame.shape
+                    cx, cy = (hand_pts[0] * (w, h)).astype(int)
+                    draw_text(frame, countdown_text, (cx + 20, cy), 0.7, (255, 0, 0), 2)
             else:
-                # Hand is visible but gesture is unknown
-                current_gesture = None
+                # New gesture detected, reset timer
+                current_gesture = gesture
+                gesture_start_time = now
+        else:
+            # Hand is visible but gesture is unknown
+            current_gesture = None
     else:
         # No hands visible
         current_gesture = None
@@ -198,8 +338,7 @@ while True:
     
     # Priority 1: High Level Alerts
     if top_alert_text:
-        cv2.putText(frame, f"ALERT: {top_alert_text}", (20, 50), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)
+        draw_text(frame, f"ALERT: {top_alert_text}", (20, 50), 0.8, (0, 0, 255), 3)
     
     # Priority 2: Confirmed Status
     # Check if confirmed text is an Emergency to force RED color
@@ -207,13 +346,15 @@ while True:
     if "EMERGENCY" in confirmed_text:
         display_color = (0, 0, 255)
 
-    cv2.putText(frame, f"Status: {confirmed_text}", (20, 100), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1, display_color, 2)
-
-    cv2.imshow("Patient Monitor - All In One", frame)
+    draw_text(frame, f"Status: {confirmed_text}", (20, 100), 1, display_color, 2)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+    # Each capture is a fresh array, so the frame can be handed over without a copy
+    display.show(frame)
 
+executor.shutdown(wait=True)
+for detector in detectors.values():
+    detector.close()
+cam.stop()
 cap.release()
-cv2.destroyAllWindows()
+display.quit.set()
+display.join()
@@ -1,129 +1,165 @@
+import os
+os.environ.setdefault("GLOG_minloglevel", "2") # Silence MediaPipe's init logging; must precede the import
+
 import cv2
 import mediapipe as mp
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
 import time
 import math
+import numpy as np
+from gesture_core import (CameraThread, DisplayThread, draw_text, fingers_from_landmarks,
+                          get_thumb_sign, landmarks_to_array, to_landmark_list)
 
 # ==========================================
 #        1. INITIALIZATION & SETUP
 # ==========================================
 
-# --- MediaPipe Solutions ---
+# --- MediaPipe Solutions (drawing only) ---
 mp_hands = mp.solutions.hands
 mp_draw = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
+# --- MediaPipe Tasks ---
+HAND_MODEL_PATH = "hand_landmarker.task"
+
+BaseOptions = python.BaseOptions
+VisionRunningMode = vision.RunningMode
+
 # Initialize Detectors
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7)
+# Tasks landmarker runs on the XNNPACK CPU delegate; VIDEO mode tracks across frames,
+# so palm detection only re-runs when tracking is lost
+hands = vision.HandLandmarker.create_from_options(vision.HandLandmarkerOptions(
+    base_options=BaseOptions(model_asset_path=HAND_MODEL_PATH, delegate=BaseOptions.Delegate.CPU),
+    running_mode=VisionRunningMode.VIDEO, num_hands=1,
+    min_hand_detection_confidence=0.7, min_tracking_confidence=0.5))
 
 # --- Configuration ---
 # Time to hold ANY gesture before it activates
 GESTURE_HOLD_TIME = 3.0           
 
+# Detectors run on a downscaled copy; landmarks are normalized so drawing stays full-res
+DETECT_SIZE = (320, 240)         # Width, Height
+
 # --- State Variables ---
 current_gesture = None
 gesture_start_time = 0
 confirmed_text = "Monitoring Active"
+last_seconds_left = -1   # Whole seconds shown in the cached countdown label
+countdown_text = ""
+hand_label = None        # Handedness the cached thumb sign was derived from
+thumb_sign = 1
 status_color = (0, 255, 0) # Green
 
+# Pre-allocated frame buffers (downscaled, RGB), reused every frame
+small_buf = np.empty((DETECT_SIZE[1], DETECT_SIZE[0], 3), np.uint8)
+rgb_buf = np.empty_like(small_buf)
+
 # --- Camera Setup ---
 cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
 cap.set(3, 640) # Width
 cap.set(4, 480) # Height
+cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Don't let the driver queue up stale frames
 
 # ==========================================
 #        2. HELPER FUNCTIONS
 # ==========================================
 
-def get_fingers_status(hand, label):
-    """Returns list of 1s (Open) and 0s (Closed) for [Thumb, Index, Middle, Ring, Pinky]"""
-    lm = hand.landmark
-    fingers = []
-    TIP_IDS = [4, 8, 12, 16, 20]
-
-    # Thumb Logic (Mirror Safe)
-    if label == "Left": 
-        fingers.append(1 if lm[4].x < lm[3].x else 0)
-    else: 
-        fingers.append(1 if lm[4].x > lm[3].x else 0)
-
-    # 4 Fingers Logic
-    for i in range(1, 5):
-        fingers.append(1 if lm[TIP_IDS[i]].y < lm[TIP_IDS[i]-2].y else 0)
-            
-    return fingers
-
-def identify_gesture(f):
-    """Maps finger states to meaning."""
-    # [Thumb, Index, Middle, Ring, Pinky]
-    
-    # --- MODIFIED MAPPINGS ---
-    if f == [1, 1, 0, 0, 0]: return "Need Water/Food"
-    if f == [0, 1, 0, 0, 0]: return "Want Restroom"
-    if f == [0, 0, 1, 1, 1]: return "Want Medicine"
-    if f == [0, 1, 1, 0, 0]: return "Call Caregiver"
-    if f == [1, 0, 0, 0, 0]: return "Adjust Position"
-    if f == [1, 1, 1, 0, 0]: return "Uncomfortable"
-    
-    return None
+# Gesture table keyed on the packed finger states (Thumb is the lowest bit)
+# --- MODIFIED MAPPINGS ---
+GESTURES = {
+    0b00011: "Need Water/Food",  # [1, 1, 0, 0, 0]
+    0b00010: "Want Restroom",    # [0, 1, 0, 0, 0]
+    0b11100: "Want Medicine",    # [0, 0, 1, 1, 1]
+    0b00110: "Call Caregiver",   # [0, 1, 1, 0, 0]
+    0b00001: "Adjust Position",  # [1, 0, 0, 0, 0]
+    0b00111: "Uncomfortable",    # [1, 1, 1, 0, 0]
+}
 
 # ==========================================
 #        3. MAIN LOOP
 # ==========================================
 print("System Starting... Press 'q' to exit.")
 
-while True:
-    success, frame = cap.read()
+# Warm up on a blank frame so model init and buffer allocation happen here,
+# not as a stall on the first real frame
+dummy = np.zeros((DETECT_SIZE[1], DETECT_SIZE[0], 3), np.uint8)
+dummy.flags.writeable = False
+hands.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=dummy), 0) # Real frames use later timestamps
+print("Warmup done")
+
+# Capture runs on its own thread, overlapping the camera with detection
+cam = CameraThread(cap)
+cam.start()
+
+# Display runs on its own thread too; the loop ends once 'q' is pressed there
+display = DisplayThread("Patient Monitor - Gestures Only")
+display.start()
+
+while not display.quit.is_set():
+    success, frame = cam.read_latest()
     if not success: continue
+    now = time.monotonic() # One clock read per frame; monotonic so NTP jumps can't skew timers
 
-    # Flip & Convert
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # Flip, Downscale & Convert
+    # Mirror in place: every capture is a fresh array we own, and drawing needs a
+    # contiguous image, so a frame[:, ::-1] view would only move the copy elsewhere
+    cv2.flip(frame, 1, dst=frame)
+    small = cv2.resize(frame, DETECT_SIZE, dst=small_buf, interpolation=cv2.INTER_AREA)
+    rgb_buf.flags.writeable = True
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+    rgb.flags.writeable = False # Read-only input lets MediaPipe skip its defensive copy
 
-    countdown_text = ""
-    
     # ----------------------------------------------------
     # GESTURE RECOGNITION (Unified 3s Timer)
     # ----------------------------------------------------
-    hand_results = hands.process(rgb)
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+    hand_results = hands.detect_for_video(mp_image, int(now * 1000))
     
-    if hand_results.multi_hand_landmarks:
-        for idx, hand_lm in enumerate(hand_results.multi_hand_landmarks):
-            mp_draw.draw_landmarks(frame, hand_lm, mp_hands.HAND_CONNECTIONS)
-            
-            # Get Hand Label (Left/Right) and Finger States
-            if hand_results.multi_handedness:
-                label = hand_results.multi_handedness[idx].classification[0].label
-                fingers = get_fingers_status(hand_lm, label)
-                gesture = identify_gesture(fingers)
-
-                if gesture:
-                    # If we are holding the SAME gesture
-                    if gesture == current_gesture:
-                        hold_duration = time.time() - gesture_start_time
-                        
-                        # Calculate remaining seconds for UI (3...2...1)
-                        seconds_left = math.ceil(GESTURE_HOLD_TIME - hold_duration)
-                        
-                        if hold_duration > GESTURE_HOLD_TIME:
-                            # --- 3 SECONDS PASSED: CONFIRM GESTURE ---
-                            confirmed_text = gesture
-                            status_color = (0, 255, 0) # Green for confirmed
-                        else:
-                            # --- COUNTING DOWN ---
-                            countdown_text = f"Holding: {seconds_left}s"
-                            
-                            # Draw countdown near the hand
-                            h, w, c = frame.shape
-                            cx, cy = int(hand_lm.landmark[0].x * w), int(hand_lm.landmark[0].y * h)
-                            cv2.putText(frame, countdown_text, (cx + 20, cy), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+    if hand_results.hand_landmarks:
+        # num_hands=1, so there is at most one hand to look at
+        hand_lm = hand_results.hand_landmarks[0]
+        hand_pts = landmarks_to_array(hand_lm) # Shared by finger states and the wrist label
+        mp_draw.draw_landmarks(frame, to_landmark_list(hand_lm), mp_hands.HAND_CONNECTIONS)
+        
+        # Get Hand Label (Left/Right) and Finger States
+        if hand_results.handedness:
+            label = hand_results.handedness[0][0].category_name
+            if label != hand_label: # Handedness rarely changes; only re-derive the sign when it does
+                hand_label = label
+                thumb_sign = get_thumb_sign(label)
+            gesture = GESTURES.get(fingers_from_landmarks(hand_pts, thumb_sign))
+
+            if gesture:
+                # If we are holding the SAME gesture
+                if gesture == current_gesture:
+                    hold_duration = now - gesture_start_time
+                    
+                    # Calculate remaining seconds for UI (3...2...1)
+                    seconds_left = math.ceil(GESTURE_HOLD_TIME - hold_duration)
+                    
+                    if hold_duration > GESTURE_HOLD_TIME:
+                        # --- 3 SECONDS PASSED: CONFIRM GESTURE ---
+                        confirmed_text = gesture
+                        status_color = (0, 255, 0) # Green for confirmed
                     else:
-                        # New gesture detected, reset timer
-                        current_gesture = gesture
-                        gesture_start_time = time.time()
+                        # --- COUNTING DOWN ---
+                        # Only re-format the label when the whole-second value ticks
+                        if seconds_left != last_seconds_left:
+                            last_seconds_left = seconds_left
+                            countdown_text = f"Holding: {seconds_left}s"
+                        
+                        # Draw countdown near the hand
+                        h, w, c = frame.shape
+                        cx, cy = (hand_pts[0] * (w, h)).astype(int)
+                        draw_text(frame, countdown_text, (cx + 20, cy), 0.7, (255, 0, 0), 2)
                 else:
-                    # Hand is visible but gesture is unknown
-                    current_gesture = None
+                    # New gesture detected, reset timer
+                    current_gesture = gesture
+                    gesture_start_time = now
+            else:
+                # Hand is visible but gesture is unknown
+                current_gesture = None
     else:
         # No hands visible
         current_gesture = None
@@ -132,14 +168,14 @@ while True:
     #        4. FINAL DISPLAY COMPOSITION
     # ==========================================
     
-    cv2.putText(frame, f"Status: {confirmed_text}", (20, 50), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1, status_color, 2)
-
-    cv2.imshow("Patient Monitor - Gestures Only", frame)
+    draw_text(frame, f"Status: {confirmed_text}", (20, 50), 1, status_color, 2)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+    # Each capture is a fresh array, so the frame can be handed over without a copy
+    display.show(frame)
 
+hands.close()
+cam.stop()
 cap.release()
-cv2.destroyAllWindows()
+display.quit.set()
+display.join()
 
@@ -0,0 +1,162 @@
+# Shared helpers for the gesture scripts (05_gesture_fall_stroke.py, 06_gesture_withoutIoT.py).
+# Keep this file next to them so they can import it.
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+# ==========================================
+#        1. FINGER STATES
+# ==========================================
+
+# Finger tip landmarks and the joint two below each tip
+TIP_IDS = np.array([4, 8, 12, 16, 20])
+PIP_IDS = TIP_IDS - 2
+
+# Same, without the thumb (which is judged on x instead of y); sliced once here, not per call
+FINGER_TIP_IDS = TIP_IDS[1:]
+FINGER_PIP_IDS = PIP_IDS[1:]
+
+def landmarks_to_array(landmarks):
+    """Reads x, y of every landmark into an (N, 2) float32 array in one pass."""
+    return np.fromiter((c for p in landmarks for c in (p.x, p.y)),
+                       dtype=np.float32, count=2 * len(landmarks)).reshape(-1, 2)
+
+def to_landmark_list(landmarks):
+    """Wraps Tasks API landmarks in the proto that mp.solutions.drawing_utils expects."""
+    return landmark_pb2.NormalizedLandmarkList(
+        landmark=[landmark_pb2.NormalizedLandmark(x=p.x, y=p.y, z=p.z) for p in landmarks])
+
+def get_thumb_sign(label):
+    """Direction an open thumb points along x for the given handedness (mirror safe)."""
+    return -1 if label == "Left" else 1
+
+def get_fingers_status(pts, thumb_sign):
+    """Returns array of 1s (Open) and 0s (Closed) for [Thumb, Index, Middle, Ring, Pinky]"""
+    fingers = np.empty(5, dtype=np.uint8)
+
+    # Thumb Logic (Mirror Safe): tip beyond the IP joint in the thumb's direction
+    fingers[0] = (pts[4, 0] - pts[3, 0]) * thumb_sign > 0
+
+    # 4 Fingers Logic (single vectorized compare)
+    fingers[1:] = pts[FINGER_TIP_IDS, 1] < pts[FINGER_PIP_IDS, 1]
+            
+    return fingers
+
+# Bit weight of each finger when packing [Thumb, Index, Middle, Ring, Pinky] into an int
+FINGER_BITS = np.array([1, 2, 4, 8, 16])
+
+def fingers_from_landmarks(pts, thumb_sign):
+    """Packs the finger states into a 5-bit gesture key (Thumb is the lowest bit)."""
+    return int(get_fingers_status(pts, thumb_sign) @ FINGER_BITS)
+
+# ==========================================
+#        2. TEXT RENDERING
+# ==========================================
+
+# Pre-rendered text: (text, scale, color, thickness) -> (color strip, glyph mask, origin offset in the strip),
+# or None when the build anti-aliases the glyphs and putText has to draw them itself
+text_cache = {}
+
+def draw_text(frame, text, org, scale, color, thickness):
+    """Drop-in for cv2.putText (Hershey Simplex) that rasterizes each distinct string only once."""
+    key = (text, scale, color, thickness)
+    if key not in text_cache:
+        (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        pad = thickness
+        mask = np.zeros((th + baseline + 2 * pad, tw + 2 * pad), np.uint8)
+        cv2.putText(mask, text, (pad, pad + th), cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness)
+        # OpenCV 4.x draws binary (LINE_8) glyphs, which a masked copy reproduces exactly and faster.
+        # Builds that anti-alias the text blend the edges, and blending the cache costs more than putText
+        if np.any((mask > 0) & (mask < 255)):
+            text_cache[key] = None
+        else:
+            strip = np.empty(mask.shape + (3,), np.uint8)
+            strip[:] = color
+            text_cache[key] = (strip, mask, pad, pad + th)
+    if text_cache[key] is None:
+        cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+        return
+    strip, mask, ox, oy = text_cache[key]
+
+    # Masked copy of the strip onto the frame, clipped to the frame edges
+    x0, y0 = org[0] - ox, org[1] - oy
+    fx0, fy0 = max(x0, 0), max(y0, 0)
+    fx1 = min(x0 + mask.shape[1], frame.shape[1])
+    fy1 = min(y0 + mask.shape[0], frame.shape[0])
+    if fx0 >= fx1 or fy0 >= fy1: return
+    sy, sx = slice(fy0 - y0, fy1 - y0), slice(fx0 - x0, fx1 - x0)
+    cv2.copyTo(strip[sy, sx], mask[sy, sx], frame[fy0:fy1, fx0:fx1])
+
+# ==========================================
+#        3. CAPTURE & DISPLAY THREADS
+# ==========================================
+
+class CameraThread(threading.Thread):
+    """Keeps reading the camera so the main loop always gets the newest frame."""
+
+    def __init__(self, cap):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.frame = None
+        self.lock = threading.Lock()
+        self.new_frame = threading.Event()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            success, frame = self.cap.read()
+            if not success: continue
+            # cap.read() hands back a fresh array, so swapping the reference is enough.
+            # The event is only set/cleared under the lock, so it is set iff a frame is pending
+            with self.lock:
+                self.frame = frame
+                self.new_frame.set()
+
+    def read_latest(self, timeout=1.0):
+        """Waits for a frame newer than the last one read. Returns (success, frame) like cap.read()."""
+        if not self.new_frame.wait(timeout):
+            return False, None
+        with self.lock:
+            # Take ownership: the caller edits the frame in place, so it must never be handed out twice
+            frame, self.frame = self.frame, None
+            self.new_frame.clear()
+        if frame is None:
+            return False, None
+        return True, frame
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+class DisplayThread(threading.Thread):
+    """Shows frames on its own thread so imshow/waitKey never block detection."""
+
+    def __init__(self, window_name):
+        super().__init__(daemon=True)
+        self.window_name = window_name
+        self.frames = queue.Queue(maxsize=1)
+        self.quit = threading.Event() # Set once 'q' is pressed (or on shutdown)
+
+    def run(self):
+        # HighGUI windows belong to the thread that creates them, so all GUI calls live here
+        cv2.namedWindow(self.window_name)
+        while not self.quit.is_set():
+            try:
+                cv2.imshow(self.window_name, self.frames.get(timeout=0.1))
+            except queue.Empty:
+                pass
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.quit.set()
+        cv2.destroyAllWindows()
+
+    def show(self, frame):
+        """Queues a frame for display, dropping the previous one if it wasn't shown yet."""
+        try:
+            self.frames.get_nowait()
+        except queue.Empty:
+            pass
+        self.frames.put_nowait(frame)